@@ -1,5 +1,117 @@
-New-Item -Path build -ItemType Directory -Force
-New-Item -Path bin -ItemType Directory -Force
+param(
+    [switch]$DebugBuild,
+    [switch]$Force
+)
 
-rc /fo"build\antistatic.res" antistatic.rc
-cl /Fo"build\antistatic.obj" /Fe"bin\Antistatic.exe" "src\Antistatic.cpp" "build\antistatic.res" /std:c++17 /EHsc /analyze /link /SUBSYSTEM:WINDOWS /RELEASE /GUARD:CF /NXCOMPAT
+# Every path below is relative to the repository root; the finally block also runs on exit
+Push-Location -Path $PSScriptRoot
+try {
+    # Resolve the whole toolchain with one lookup instead of once per call
+    $tools = @{}
+    Get-Command cl.exe, link.exe, rc.exe, sccache.exe -CommandType Application -ErrorAction SilentlyContinue |
+        ForEach-Object { if (-not $tools.ContainsKey($_.Name)) { $tools[$_.Name] = $_.Source } }
+    foreach ($tool in 'cl.exe', 'link.exe', 'rc.exe') {
+        if (-not $tools.ContainsKey($tool)) {
+            Write-Error "$tool not found on PATH, run this from a Developer PowerShell for Visual Studio"
+            exit 1
+        }
+    }
+
+    foreach ($dir in 'build', 'build\deps', 'bin') {
+        if (-not (Test-Path -Path $dir -PathType Container)) {
+            New-Item -Path $dir -ItemType Directory | Out-Null
+        }
+    }
+
+    $cl = $tools['cl.exe']
+    $sources = Get-ChildItem -Path src -Filter *.cpp
+    $sourcePaths = $sources | ForEach-Object { "src\$($_.Name)" }
+    $objects = $sources | ForEach-Object { "build\$($_.BaseName).obj" }
+    $resource = 'build\antistatic.res'
+    $compileFlags = @('/nologo', '/std:c++17', '/EHsc', '/analyze', '/Fobuild\', '/sourceDependencies', 'build\deps')
+    $linkFlags = @('/NOLOGO', '/SUBSYSTEM:WINDOWS', '/GUARD:CF', '/NXCOMPAT')
+    if ($DebugBuild) {
+        $compileFlags += @('/Od', '/Z7')
+        # /DEBUG implies /INCREMENTAL, which /GUARD:CF rejects with LNK4075
+        $linkFlags += @('/DEBUG', '/INCREMENTAL:NO')
+    } else {
+        $compileFlags += @('/O2', '/GL', '/Gy', '/Gw')
+        # LTCG code generation happens in the linker, give it up to its maximum of 8 threads
+        $linkFlags += @('/RELEASE', '/LTCG', '/OPT:REF', '/OPT:ICF', "/CGTHREADS:$([Math]::Min([Environment]::ProcessorCount, 8))")
+    }
+
+    $output = 'bin\Antistatic.exe'
+
+    # sccache cannot cache PCH compiles, so the precompiled header is only used without it
+    $useSccache = $tools.ContainsKey('sccache.exe')
+    $pch = 'build\pch.pch'
+    $pchFlags = @()
+    if (-not $useSccache) {
+        $pchFlags = @('/Yupch.h', "/Fp$pch")
+    }
+
+    # Record the flags so switching between debug and release still triggers a rebuild
+    $flagsFile = 'build\flags.txt'
+    $flagsText = ($compileFlags + $pchFlags + $linkFlags) -join ' '
+    if (-not (Test-Path -Path $flagsFile) -or (Get-Content -Path $flagsFile -Raw) -ne $flagsText) {
+        Set-Content -Path $flagsFile -Value $flagsText -NoNewline
+    }
+
+    $dependencies = @($sources) + @(Get-ChildItem -Path src -Filter *.h) + (Get-Item -Path 'antistatic.rc', 'assets\antistatic.ico', $flagsFile, $PSCommandPath)
+
+    # A toolset update replaces these, which should rebuild even when no source changed
+    $dependencies += @(Get-Item -Path $cl, $tools['link.exe'], $tools['rc.exe'])
+
+    # Headers each source included last time, as reported by /sourceDependencies
+    $dependencies += @(Get-ChildItem -Path 'build\deps' -Filter *.json |
+        ForEach-Object { (Get-Content -Path $_.FullName -Raw | ConvertFrom-Json).Data.Includes } |
+        Sort-Object -Unique |
+        Where-Object { Test-Path -Path $_ } |
+        Get-Item)
+
+    if (-not $Force -and (Test-Path -Path $output)) {
+        $builtAt = (Get-Item -Path $output).LastWriteTimeUtc
+        $newest = ($dependencies | Sort-Object -Property LastWriteTimeUtc -Descending | Select-Object -First 1).LastWriteTimeUtc
+        if ($newest -le $builtAt) {
+            Write-Host "$output is up to date"
+            exit 0
+        }
+    }
+
+    & $tools['rc.exe'] /nologo /fo$resource antistatic.rc
+    if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
+
+    # sccache only caches compile-only calls with a single source, so feed it one file at a time
+    if ($useSccache) {
+        foreach ($source in $sourcePaths) {
+            & $tools['sccache.exe'] $cl /c $compileFlags $source
+            if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
+        }
+    } else {
+        # Rebuild the precompiled header when forced, when its outputs or recorded includes are missing,
+        # or when it is older than pch.h, pch.cpp, the flags, the compiler or any header it froze
+        $pchObject = 'build\pch.obj'
+        $pchDependencies = 'build\deps\pch.cpp.json'
+        $pchStale = $Force -or -not (Test-Path -Path $pch) -or -not (Test-Path -Path $pchObject) -or -not (Test-Path -Path $pchDependencies)
+        if (-not $pchStale) {
+            $pchInputs = @(Get-Item -Path 'src\pch.h', 'src\pch.cpp', $flagsFile, $cl)
+            $pchInputs += @((Get-Content -Path $pchDependencies -Raw | ConvertFrom-Json).Data.Includes |
+                Where-Object { Test-Path -Path $_ } |
+                Get-Item)
+            $pchBuiltAt = (Get-Item -Path $pch).LastWriteTimeUtc
+            $pchStale = [bool]($pchInputs | Where-Object { $_.LastWriteTimeUtc -gt $pchBuiltAt })
+        }
+        if ($pchStale) {
+            & $cl /c $compileFlags /Ycpch.h /Fp$pch 'src\pch.cpp'
+            if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
+        }
+
+        & $cl /c /MP $compileFlags $pchFlags ($sourcePaths | Where-Object { $_ -ne 'src\pch.cpp' })
+        if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
+    }
+
+    & $tools['link.exe'] /OUT:$output $objects $resource $linkFlags
+    exit $LASTEXITCODE
+} finally {
+    Pop-Location
+}
@@ -1,7 +1,4 @@
-#include <windows.h>
-#include <iostream>
-#include <string>
-#include <fstream>
+#include "pch.h"
 
 int main() {
     std::cout << "Running main() for some reason? This won't do anything." << std::endl;
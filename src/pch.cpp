@@ -0,0 +1,2 @@
+// Builds the precompiled header, see build.ps1
+#include "pch.h"
@@ -0,0 +1,6 @@
+#pragma once
+
+#include <windows.h>
+#include <iostream>
+#include <string>
+#include <fstream>